@@ -1,11 +1,16 @@
 import os
+import sys
 from logging.config import fileConfig
 
 from alembic import context
 from sqlalchemy import engine_from_config, pool
 
-from app.db.database import Base
-from app.db.models import *  # noqa 
+# Модули приложения импортируют друг друга от корня app/.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from core.config import settings  # noqa: E402
+from db.database import Base  # noqa: E402
+from db.models import *  # noqa 
 
 
 try:
@@ -19,7 +24,7 @@ url = config.get_main_option("sqlalchemy.url")
 
 
 if url == "IN_ENV":
-    database_url = os.getenv("DATABASE_URL")
+    database_url = os.getenv("DATABASE_URL", settings.DATABASE_URL)
     if not database_url:
         raise RuntimeError("DATABASE_URL is not set!")
     config.set_main_option("sqlalchemy.url", database_url)
@@ -0,0 +1,36 @@
+"""Chat owner
+
+Revision ID: a3c5e9d17b42
+Revises: e7f93b1a5c68
+Create Date: 2026-10-19 18:41:05.214379
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e9d17b42'
+down_revision = 'e7f93b1a5c68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('owner_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('chats_owner_id_fkey', 'chats', 'users', ['owner_id'], ['id'])
+    # Владельцем существующей группы становится первый вступивший участник.
+    op.execute("""
+        UPDATE chats SET owner_id = (
+            SELECT user_id FROM chat_members
+            WHERE chat_members.chat_id = chats.id
+            ORDER BY joined_at, user_id
+            LIMIT 1
+        )
+        WHERE is_group
+    """)
+
+
+def downgrade() -> None:
+    op.drop_constraint('chats_owner_id_fkey', 'chats', type_='foreignkey')
+    op.drop_column('chats', 'owner_id')
@@ -0,0 +1,51 @@
+"""Canonical chat pairs
+
+Revision ID: b83e04a6c2d9
+Revises: 5f1c2d7e9a41
+Create Date: 2026-10-19 11:40:05.772913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b83e04a6c2d9'
+down_revision = '5f1c2d7e9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Чаты, созданные для одной пары в разном порядке, сливаются в самый
+    # ранний; их сообщения переносятся в него.
+    op.execute("""
+        CREATE TEMPORARY TABLE chat_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT id, MIN(id) OVER (
+                PARTITION BY LEAST(user1_id, user2_id),
+                             GREATEST(user1_id, user2_id)
+            ) AS keep_id
+            FROM chats
+        ) pairs
+        WHERE id <> keep_id
+    """)
+    op.execute("""
+        UPDATE messages SET chat_id = d.keep_id
+        FROM chat_duplicates d WHERE messages.chat_id = d.id
+    """)
+    op.execute("""
+        DELETE FROM chats USING chat_duplicates d WHERE chats.id = d.id
+    """)
+    op.execute("""
+        UPDATE chats
+        SET user1_id = user2_id, user2_id = user1_id
+        WHERE user1_id > user2_id
+    """)
+    op.create_check_constraint(
+        '_user_pair_order_ck', 'chats', sa.text('user1_id <= user2_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('_user_pair_order_ck', 'chats', type_='check')
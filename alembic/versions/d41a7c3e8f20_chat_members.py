@@ -0,0 +1,53 @@
+"""Chat members
+
+Revision ID: d41a7c3e8f20
+Revises: b83e04a6c2d9
+Create Date: 2026-10-19 13:02:17.550864
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7c3e8f20'
+down_revision = 'b83e04a6c2d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_members',
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('joined_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('chat_id', 'user_id')
+    )
+    op.create_index(op.f('ix_chat_members_user_id'), 'chat_members', ['user_id'], unique=False)
+    op.add_column('chats', sa.Column('name', sa.String(), nullable=True))
+    op.add_column('chats', sa.Column('is_group', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.alter_column('chats', 'user1_id', existing_type=sa.INTEGER(), nullable=True)
+    op.alter_column('chats', 'user2_id', existing_type=sa.INTEGER(), nullable=True)
+    op.execute("""
+        INSERT INTO chat_members (chat_id, user_id)
+        SELECT id, user1_id FROM chats
+        UNION
+        SELECT id, user2_id FROM chats
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        DELETE FROM messages WHERE chat_id IN (
+            SELECT id FROM chats WHERE is_group
+        )
+    """)
+    op.execute("DELETE FROM chats WHERE is_group")
+    op.alter_column('chats', 'user2_id', existing_type=sa.INTEGER(), nullable=False)
+    op.alter_column('chats', 'user1_id', existing_type=sa.INTEGER(), nullable=False)
+    op.drop_column('chats', 'is_group')
+    op.drop_column('chats', 'name')
+    op.drop_index(op.f('ix_chat_members_user_id'), table_name='chat_members')
+    op.drop_table('chat_members')
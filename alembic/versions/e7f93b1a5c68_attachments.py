@@ -0,0 +1,42 @@
+"""Attachments
+
+Revision ID: e7f93b1a5c68
+Revises: d41a7c3e8f20
+Create Date: 2026-10-19 15:27:48.096135
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7f93b1a5c68'
+down_revision = 'd41a7c3e8f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('attachments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('uploader_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['uploader_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attachments_sha256'), 'attachments', ['sha256'], unique=False)
+    op.add_column('messages', sa.Column('attachment_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_messages_attachment_id'), 'messages', ['attachment_id'], unique=False)
+    op.create_foreign_key('messages_attachment_id_fkey', 'messages', 'attachments', ['attachment_id'], ['id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('messages_attachment_id_fkey', 'messages', type_='foreignkey')
+    op.drop_index(op.f('ix_messages_attachment_id'), table_name='messages')
+    op.drop_column('messages', 'attachment_id')
+    op.drop_index(op.f('ix_attachments_sha256'), table_name='attachments')
+    op.drop_table('attachments')
@@ -1,6 +1,10 @@
+# Импортируется первым, чтобы профиль запуска учёл все импорты.
+from core.profiling import startup_profile
+
 import logging
 
 from celery import Celery
+from celery.signals import worker_ready
 
 from core.config import settings
 
@@ -17,9 +21,22 @@ celery_app = Celery(
 
 
 celery_app.conf.task_always_eager = False
+# Результаты уведомлений никто не читает: исходы учитываются в
+# core.notification_stats, а backend используется только по явному запросу.
+celery_app.conf.task_ignore_result = True
+celery_app.conf.task_store_errors_even_if_ignored = False
 celery_app.conf.result_backend_transport_options = {"visibility_timeout": 3600}
 celery_app.conf.worker_hijack_root_logger = False
-celery_app.conf.worker_pool = "solo"
+celery_app.conf.worker_pool = settings.CELERY_WORKER_POOL
+celery_app.conf.worker_concurrency = settings.CELERY_WORKER_CONCURRENCY
+celery_app.conf.worker_prefetch_multiplier = (
+    settings.CELERY_PREFETCH_MULTIPLIER
+)
+# С acks_late незавершённая задача вернётся в очередь через
+# visibility_timeout, если воркер упадёт.
+celery_app.conf.task_acks_late = True
+celery_app.conf.task_reject_on_worker_lost = True
+celery_app.conf.broker_transport_options = {"visibility_timeout": 3600}
 
 celery_app.autodiscover_tasks(["celery_tasks"])
 
@@ -31,12 +48,21 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     task_routes={
-        'send_notification_task': {'queue': 'default'}
+        'send_notification_task': {'queue': 'default'},
+        'celery_tasks.tasks.export_chat_task': {
+            'queue': settings.CELERY_EXPORT_QUEUE
+        },
     },
     task_default_queue='default',
 )
 
 
+@worker_ready.connect
+def report_worker_startup(**kwargs):
+    startup_profile.mark("запуск воркера Celery")
+    logger.info(startup_profile.report())
+
+
 @celery_app.task(bind=True)
 def debug_task(self):
     print(f"Отладочная задача выполнена: {self.request!r}")
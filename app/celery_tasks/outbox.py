@@ -0,0 +1,43 @@
+from sqlalchemy.orm import Session
+
+from celery_config import celery_app
+from celery_tasks.tasks import send_notification_task
+from db.models import NotificationOutbox
+
+
+def relay_outbox_batch(db: Session, batch_size: int) -> int:
+    """Публикует в брокер пачку уведомлений из outbox.
+
+    Строки блокируются через SKIP LOCKED, поэтому несколько процессов
+    могут ретранслировать outbox параллельно без дублей. Все задачи пачки
+    отправляются через одно соединение с брокером, после чего строки
+    удаляются одним запросом. Если брокер недоступен, транзакция
+    откатывается и уведомления остаются в outbox до следующей попытки.
+    """
+    rows = db.query(
+        NotificationOutbox.id,
+        NotificationOutbox.telegram_id,
+        NotificationOutbox.text
+    ).order_by(
+        NotificationOutbox.id
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not rows:
+        db.rollback()
+        return 0
+
+    try:
+        with celery_app.producer_or_acquire() as producer:
+            for row in rows:
+                send_notification_task.apply_async(
+                    args=[row.telegram_id, row.text],
+                    producer=producer
+                )
+        db.query(NotificationOutbox).filter(
+            NotificationOutbox.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
@@ -1,42 +1,104 @@
 import logging
+import random
 
-from aiogram import Bot
-from asgiref.sync import async_to_sync
 from celery import shared_task
 
 from celery_config import celery_app
-from telegram.bot import API_TOKEN
+from core.config import settings
+from core.export import write_chat_export, set_export_status
+from core.notification_stats import (
+        record_notification, SENT, RETRIED, FAILED, DEAD_LETTERED)
+from telegram.client import (
+        send_message, TelegramError, TelegramRetryableError)
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
-def send_notification_task(telegram_id: int, message: str):
+def retry_countdown(retries: int, retry_after: float = 0) -> float:
+    """Экспоненциальная задержка с джиттером, не меньше retry_after."""
+    backoff = min(
+        settings.NOTIFICATION_RETRY_BACKOFF_MAX,
+        settings.NOTIFICATION_RETRY_BACKOFF * (2 ** retries)
+    )
+    return max(retry_after, random.uniform(backoff / 2, backoff))
+
+
+@shared_task(
+    bind=True,
+    acks_late=True,
+    max_retries=settings.NOTIFICATION_MAX_RETRIES
+)
+def send_notification_task(
+    self,
+    telegram_id: int,
+    message: str,
+    dead_lettered: bool = False
+):
     """
-    Синхронная задача для отправки уведомления через Telegram.
+    Задача для отправки уведомления через Telegram.
+
+    Временные ошибки повторяются с экспоненциальной задержкой. После
+    исчерпания попыток задача перекладывается в очередь недоставленных
+    уведомлений, откуда её можно переиграть воркером с
+    `-Q dead_letter`. Переигранная задача (`dead_lettered=True`) при
+    повторной неудаче больше не перекладывается, а считается сбоем.
     """
     try:
         print(
             "[Telegram Notification] Отправка сообщения Telegram ID: "
             f"{telegram_id}, текст: {message}"
         )
+        send_message(chat_id=telegram_id, text=message)
+        record_notification(SENT)
+    except TelegramRetryableError as e:
+        if self.request.retries >= self.max_retries and dead_lettered:
+            print(
+                "[Telegram Notification] Переотправка из "
+                f"{settings.CELERY_DEAD_LETTER_QUEUE} не удалась: {e}"
+            )
+            record_notification(FAILED, telegram_id, str(e))
+            raise
+        if self.request.retries >= self.max_retries:
+            print(
+                "[Telegram Notification] Попытки исчерпаны, уведомление "
+                f"перемещено в {settings.CELERY_DEAD_LETTER_QUEUE}: {e}"
+            )
+            send_notification_task.apply_async(
+                args=[telegram_id, message],
+                kwargs={"dead_lettered": True},
+                queue=settings.CELERY_DEAD_LETTER_QUEUE
+            )
+            record_notification(DEAD_LETTERED, telegram_id, str(e))
+            raise
+        record_notification(RETRIED)
+        raise self.retry(
+            exc=e,
+            countdown=retry_countdown(self.request.retries, e.retry_after)
+        )
+    except TelegramError as e:
+        print(f"[Telegram Notification] Ошибка при отправке сообщения: {e}")
+        record_notification(FAILED, telegram_id, str(e))
+        raise
 
-        async def send_message():
-            async with Bot(token=API_TOKEN) as bot:
-                await bot.send_message(chat_id=telegram_id, text=message)
 
-        async_to_sync(send_message)()
+@shared_task(acks_late=False)
+def export_chat_task(export_id: str, chat_id: int, fmt: str, compress: bool):
+    """Фоновый экспорт большого чата в файл на локальном диске.
 
-        return (
-            "Уведомление успешно отправлено пользователю с "
-            f"Telegram ID {telegram_id}"
-        )
+    Задача подтверждается при получении: экспорт может идти дольше
+    visibility_timeout брокера, и с acks_late Redis выдал бы её второму
+    воркеру, пока первый ещё пишет файл.
+    """
+    set_export_status(export_id, status="running")
+    try:
+        path = write_chat_export(export_id, chat_id, fmt, compress)
     except Exception as e:
-        print(f"[Telegram Notification] Ошибка при отправке сообщения: {e}")
+        set_export_status(export_id, status="failed", error=str(e)[:200])
         raise
+    set_export_status(export_id, status="ready", path=path)
 
 
-@celery_app.task
+@celery_app.task(ignore_result=False)
 def test_celery_task():
     print("Тестовая задача Celery выполнена.")
     return "OK"
@@ -65,3 +65,13 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Недействительный токен"
         )
+
+
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    """Пропускает только пользователей из ADMIN_USERNAMES."""
+    if current_user.username not in settings.ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав"
+        )
+    return current_user
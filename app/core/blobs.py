@@ -0,0 +1,156 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+
+from core.config import settings
+from core.redis import redis_client
+
+
+UPLOAD_KEY = "upload:{upload_id}"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Ошибка загрузки вложения, которую нужно вернуть клиенту."""
+
+
+def blob_path(sha256: str) -> str:
+    """Путь к блобу в хранилище, адресуемом по содержимому."""
+    return os.path.join(settings.BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def upload_path(upload_id: str) -> str:
+    return os.path.join(settings.BLOB_DIR, "uploads", upload_id)
+
+
+def start_upload(
+    user_id: int,
+    filename: str,
+    content_type: str,
+    size: int
+) -> str:
+    """Регистрирует новую загрузку и возвращает её ID."""
+    if size > settings.MAX_ATTACHMENT_BYTES:
+        raise UploadError(
+            f"Размер вложения превышает {settings.MAX_ATTACHMENT_BYTES} байт"
+        )
+    upload_id = uuid.uuid4().hex
+    os.makedirs(os.path.dirname(upload_path(upload_id)), exist_ok=True)
+    open(upload_path(upload_id), "wb").close()
+    key = UPLOAD_KEY.format(upload_id=upload_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(key, mapping={
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+    })
+    pipe.expire(key, settings.UPLOAD_TTL)
+    pipe.execute()
+    return upload_id
+
+
+def get_upload(upload_id: str, user_id: int) -> Optional[dict]:
+    """Возвращает метаданные загрузки, если она принадлежит пользователю."""
+    upload = redis_client.hgetall(UPLOAD_KEY.format(upload_id=upload_id))
+    if not upload or int(upload["user_id"]) != user_id:
+        return None
+    if not os.path.exists(upload_path(upload_id)):
+        return None
+    upload["size"] = int(upload["size"])
+    upload["received"] = os.path.getsize(upload_path(upload_id))
+    return upload
+
+
+async def append_chunk(
+    upload_id: str,
+    upload: dict,
+    offset: int,
+    chunks: AsyncIterator[bytes]
+) -> int:
+    """Дописывает часть файла, начиная с offset, и возвращает новый размер.
+
+    Смещение должно совпадать с уже принятым размером. Если соединение
+    оборвалось, принятые байты сохраняются, и клиент продолжает с
+    размера, который вернёт статус загрузки.
+    """
+    if offset != upload["received"]:
+        raise UploadError(
+            f"Ожидалось смещение {upload['received']}, получено {offset}"
+        )
+    received = offset
+    async with aiofiles.open(upload_path(upload_id), "r+b") as file:
+        await file.seek(offset)
+        try:
+            async for chunk in chunks:
+                received += len(chunk)
+                if received - offset > settings.ATTACHMENT_CHUNK_BYTES:
+                    raise UploadError("Часть файла слишком большая")
+                if received > upload["size"]:
+                    raise UploadError("Получено больше данных, чем заявлено")
+                await file.write(chunk)
+        except UploadError:
+            await file.truncate(offset)
+            raise
+    redis_client.expire(
+        UPLOAD_KEY.format(upload_id=upload_id), settings.UPLOAD_TTL
+    )
+    return received
+
+
+def finish_upload(upload_id: str, upload: dict) -> Tuple[str, int]:
+    """Переносит загруженный файл в хранилище блобов.
+
+    Возвращает SHA-256 и размер. Если такой блоб уже есть, временный
+    файл удаляется и используется существующий. Если временного файла
+    уже нет (загрузку параллельно завершил другой запрос или удалила
+    очистка), выбрасывает UploadError.
+    """
+    path = upload_path(upload_id)
+    if upload["received"] != upload["size"]:
+        raise UploadError(
+            f"Загружено {upload['received']} из {upload['size']} байт"
+        )
+
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        target = blob_path(sha256)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+    except FileNotFoundError:
+        raise UploadError("Загрузка уже завершена или не найдена")
+    redis_client.delete(UPLOAD_KEY.format(upload_id=upload_id))
+    return sha256, upload["size"]
+
+
+def cleanup_stale_uploads() -> int:
+    """Удаляет временные файлы загрузок старше UPLOAD_TTL.
+
+    Файл может исчезнуть между scandir и удалением, если загрузку
+    в этот момент завершают; такие ошибки не прерывают очистку.
+    """
+    uploads_dir = os.path.join(settings.BLOB_DIR, "uploads")
+    if not os.path.isdir(uploads_dir):
+        return 0
+    removed = 0
+    deadline = time.time() - settings.UPLOAD_TTL
+    for entry in os.scandir(uploads_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                removed += 1
+        except OSError as e:
+            print(f"Не удалось удалить загрузку {entry.path}: {e}")
+    return removed
@@ -28,6 +28,12 @@ class Settings:
     )
 
     TELEGRAM_TOKEN:  str = os.getenv("TELEGRAM_TOKEN", None)
+    # polling, webhook или off (если бот запущен отдельным процессом).
+    TELEGRAM_MODE: str = os.getenv("TELEGRAM_MODE", "polling")
+    TELEGRAM_WEBHOOK_URL: str = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+    TELEGRAM_WEBHOOK_PATH: str = "/telegram/webhook"
+    TELEGRAM_WEBHOOK_SECRET: str = os.getenv("TELEGRAM_WEBHOOK_SECRET", None)
+    TELEGRAM_LEADER_TTL: int = int(os.getenv("TELEGRAM_LEADER_TTL", 30))
 
     REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
@@ -43,5 +49,89 @@ class Settings:
         f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB + 1}"
     )
 
+    # Celery применяет monkey patching gevent только при явном `-P gevent`
+    # в командной строке, поэтому без -P воркер работает в solo-пуле.
+    # docker-compose передаёт -P gevent: он держит много одновременных
+    # запросов к Telegram.
+    CELERY_WORKER_POOL: str = os.getenv("CELERY_WORKER_POOL", "solo")
+    CELERY_WORKER_CONCURRENCY: int = int(
+        os.getenv("CELERY_WORKER_CONCURRENCY", 100)
+    )
+    CELERY_PREFETCH_MULTIPLIER: int = int(
+        os.getenv("CELERY_PREFETCH_MULTIPLIER", 4)
+    )
+    CELERY_DEAD_LETTER_QUEUE: str = os.getenv(
+        "CELERY_DEAD_LETTER_QUEUE", "dead_letter"
+    )
+    # Экспорт блокирует процесс на запросах к БД и записи файлов,
+    # поэтому выполняется отдельным воркером, а не в gevent-пуле.
+    CELERY_EXPORT_QUEUE: str = os.getenv("CELERY_EXPORT_QUEUE", "exports")
+    NOTIFICATION_MAX_RETRIES: int = int(
+        os.getenv("NOTIFICATION_MAX_RETRIES", 5)
+    )
+    NOTIFICATION_RETRY_BACKOFF: int = int(
+        os.getenv("NOTIFICATION_RETRY_BACKOFF", 2)
+    )
+    NOTIFICATION_RETRY_BACKOFF_MAX: int = int(
+        os.getenv("NOTIFICATION_RETRY_BACKOFF_MAX", 600)
+    )
+    TELEGRAM_REQUEST_TIMEOUT: float = float(
+        os.getenv("TELEGRAM_REQUEST_TIMEOUT", 10)
+    )
+    NOTIFICATION_STATS_TTL_DAYS: int = int(
+        os.getenv("NOTIFICATION_STATS_TTL_DAYS", 30)
+    )
+    NOTIFICATION_FAILURES_KEPT: int = int(
+        os.getenv("NOTIFICATION_FAILURES_KEPT", 100)
+    )
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 500))
+    OUTBOX_POLL_INTERVAL: float = float(
+        os.getenv("OUTBOX_POLL_INTERVAL", 1)
+    )
+    CHAT_CACHE_TTL: int = int(os.getenv("CHAT_CACHE_TTL", 3600))
+    MEMBERSHIP_CACHE_SIZE: int = int(
+        os.getenv("MEMBERSHIP_CACHE_SIZE", 10000)
+    )
+    MEMBERSHIP_CACHE_TTL: float = float(
+        os.getenv("MEMBERSHIP_CACHE_TTL", 60)
+    )
+    MEMBERSHIP_REDIS_TTL: int = int(os.getenv("MEMBERSHIP_REDIS_TTL", 3600))
+    EXPORT_DIR: str = os.getenv("EXPORT_DIR", "exports")
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+    EXPORT_TTL: int = int(os.getenv("EXPORT_TTL", 24 * 3600))
+    TYPING_DEBOUNCE: float = float(os.getenv("TYPING_DEBOUNCE", 2))
+    PRESENCE_DEBOUNCE: float = float(os.getenv("PRESENCE_DEBOUNCE", 5))
+    READ_DEBOUNCE: float = float(os.getenv("READ_DEBOUNCE", 1))
+    MAX_MESSAGE_LENGTH: int = int(os.getenv("MAX_MESSAGE_LENGTH", 4096))
+    MAX_WS_FRAME_BYTES: int = int(os.getenv("MAX_WS_FRAME_BYTES", 65536))
+    NOTIFICATION_PREVIEW_LENGTH: int = int(
+        os.getenv("NOTIFICATION_PREVIEW_LENGTH", 200)
+    )
+    BLOB_DIR: str = os.getenv("BLOB_DIR", "blobs")
+    MAX_ATTACHMENT_BYTES: int = int(
+        os.getenv("MAX_ATTACHMENT_BYTES", 50 * 1024 * 1024)
+    )
+    ATTACHMENT_CHUNK_BYTES: int = int(
+        os.getenv("ATTACHMENT_CHUNK_BYTES", 1024 * 1024)
+    )
+    UPLOAD_TTL: int = int(os.getenv("UPLOAD_TTL", 3600))
+
+    ADMIN_USERNAMES: list = [
+        name.strip()
+        for name in os.getenv("ADMIN_USERNAMES", "").split(",")
+        if name.strip()
+    ]
+
+    # Лимиты задаются в формате "<запросов>/<секунд>".
+    RATE_LIMIT_ENABLED: bool = (
+        os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    )
+    RATE_LIMIT_WS_USER: str = os.getenv("RATE_LIMIT_WS_USER", "30/10")
+    RATE_LIMIT_WS_CHAT: str = os.getenv("RATE_LIMIT_WS_CHAT", "60/10")
+    RATE_LIMIT_WS_EVENTS: str = os.getenv("RATE_LIMIT_WS_EVENTS", "30/10")
+    RATE_LIMIT_LOGIN: str = os.getenv("RATE_LIMIT_LOGIN", "10/60")
+    RATE_LIMIT_REGISTER: str = os.getenv("RATE_LIMIT_REGISTER", "5/60")
+    RATE_LIMIT_HISTORY: str = os.getenv("RATE_LIMIT_HISTORY", "30/60")
+
 
 settings = Settings()
@@ -0,0 +1,216 @@
+import json
+from typing import Dict, Optional, Tuple
+
+import redis
+
+from core.cache import LRUCache
+from core.config import settings
+from core.redis import redis_client
+
+
+MESSAGE = "message"
+TYPING = "typing"
+READ = "read"
+PRESENCE = "presence"
+ERROR = "error"
+
+# Эфемерные события не сохраняются в Postgres и рассылаются только
+# подключённым сокетам чата.
+EPHEMERAL_TYPES = {TYPING, READ, PRESENCE}
+PRESENCE_STATUSES = {"online", "away", "offline"}
+
+READ_CURSORS_KEY = "chat:{chat_id}:read"
+LAST_MESSAGE_KEY = "chat:{chat_id}:last_message_id"
+LAST_MESSAGE_TTL = 24 * 3600
+
+# Двигает курсор прочтения только вперёд.
+ADVANCE_CURSOR_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]))
+local new = tonumber(ARGV[2])
+if current and current >= new then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], new)
+return 1
+"""
+
+# Запоминает наибольший ID сообщения чата и продлевает ключ.
+SET_LAST_MESSAGE_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+local new = tonumber(ARGV[1])
+if not current or current < new then
+    redis.call('SET', KEYS[1], new)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+advance_cursor = redis_client.register_script(ADVANCE_CURSOR_SCRIPT)
+set_last_message = redis_client.register_script(SET_LAST_MESSAGE_SCRIPT)
+recent_events = {
+    TYPING: LRUCache(maxsize=100000, ttl=settings.TYPING_DEBOUNCE),
+    PRESENCE: LRUCache(maxsize=100000, ttl=settings.PRESENCE_DEBOUNCE),
+    READ: LRUCache(maxsize=100000, ttl=settings.READ_DEBOUNCE),
+}
+# Последнее отложенное событие (chat_id, user_id, type), которое
+# нужно разослать по окончании интервала.
+pending_events: Dict[Tuple[int, int, str], dict] = {}
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_event(raw: str) -> dict:
+    """Разбирает входящий кадр WebSocket в событие с полем type.
+
+    Кадр, не являющийся JSON-объектом с полем type, считается текстом
+    сообщения — так работают клиенты, отправляющие сырой текст.
+    Выбрасывает ValueError для некорректных событий.
+    """
+    try:
+        event = json.loads(raw)
+    except ValueError:
+        event = None
+    if not isinstance(event, dict) or "type" not in event:
+        return {"type": MESSAGE, "content": raw, "attachment_id": None}
+
+    event_type = event["type"]
+    if event_type == MESSAGE:
+        if not isinstance(event.get("content", ""), str):
+            raise ValueError("Поле content должно быть строкой")
+        attachment_id = event.get("attachment_id")
+        if attachment_id is not None and not _is_int(attachment_id):
+            raise ValueError("Поле attachment_id должно быть числом")
+        if not event.get("content") and attachment_id is None:
+            raise ValueError("Сообщение должно содержать content")
+        return {
+            "type": MESSAGE,
+            "content": event.get("content", ""),
+            "attachment_id": attachment_id,
+        }
+    if event_type == TYPING:
+        return {"type": TYPING}
+    if event_type == READ:
+        message_id = event.get("message_id")
+        if not _is_int(message_id):
+            raise ValueError("Событие read должно содержать message_id")
+        return {"type": READ, "message_id": message_id}
+    if event_type == PRESENCE:
+        if event.get("status") not in PRESENCE_STATUSES:
+            raise ValueError("Неизвестный статус присутствия")
+        return {"type": PRESENCE, "status": event["status"]}
+    raise ValueError(f"Неизвестный тип события: {event_type}")
+
+
+def coalesce_event(
+    chat_id: int,
+    user_id: int,
+    event: dict
+) -> Optional[float]:
+    """Решает, когда рассылать эфемерное событие.
+
+    От одного пользователя в чате рассылается не больше одного события
+    каждого типа за интервал. Событие внутри интервала не теряется:
+    последнее из них откладывается до конца интервала, а если оно
+    совпадает с уже разосланным, отложенное отменяется. Курсор
+    прочтения сохраняется сразу, если сдвинулся вперёд.
+
+    Возвращает 0, если событие нужно разослать сейчас, задержку, через
+    которую нужно вызвать flush_event, или None, если рассылать ничего
+    не нужно.
+    """
+    if event["type"] == READ and not update_read_cursor(
+        chat_id, user_id, event["message_id"]
+    ):
+        return None
+
+    cache = recent_events[event["type"]]
+    forwarded = cache.get((chat_id, user_id))
+    if forwarded is None:
+        cache.set((chat_id, user_id), event)
+        return 0
+
+    pending_key = (chat_id, user_id, event["type"])
+    if event == forwarded:
+        pending_events.pop(pending_key, None)
+        return None
+    scheduled = pending_key in pending_events
+    pending_events[pending_key] = event
+    return None if scheduled else cache.ttl
+
+
+def flush_event(
+    chat_id: int,
+    user_id: int,
+    event_type: str
+) -> Optional[dict]:
+    """Забирает отложенное событие и начинает с него новый интервал."""
+    event = pending_events.pop((chat_id, user_id, event_type), None)
+    if event is not None:
+        recent_events[event_type].set((chat_id, user_id), event)
+    return event
+
+
+def update_read_cursor(chat_id: int, user_id: int, message_id: int) -> bool:
+    """Сохраняет курсор прочтения в Redis, если он сдвинулся вперёд."""
+    try:
+        return bool(advance_cursor(
+            keys=[READ_CURSORS_KEY.format(chat_id=chat_id)],
+            args=[user_id, message_id]
+        ))
+    except redis.RedisError as e:
+        print(f"Не удалось сохранить курсор прочтения: {e}")
+        return False
+
+
+def get_read_cursors(chat_id: int) -> dict:
+    """Возвращает курсоры прочтения участников чата."""
+    cursors = redis_client.hgetall(READ_CURSORS_KEY.format(chat_id=chat_id))
+    return {
+        int(user_id): int(message_id)
+        for user_id, message_id in cursors.items()
+    }
+
+
+def outbound_event(chat_id: int, user_id: int, event: dict) -> str:
+    """Сериализует эфемерное событие для рассылки участникам."""
+    return json.dumps({**event, "chat_id": chat_id, "user_id": user_id})
+
+
+def error_event(message: str, **fields) -> str:
+    return json.dumps({"type": ERROR, "error": message, **fields})
+
+
+def clear_read_cursors(chat_id: int):
+    try:
+        redis_client.delete(READ_CURSORS_KEY.format(chat_id=chat_id))
+    except redis.RedisError as e:
+        print(f"Не удалось удалить курсоры прочтения чата {chat_id}: {e}")
+
+
+def record_last_message(chat_id: int, message_id: int):
+    """Запоминает ID последнего сообщения чата для проверки курсоров."""
+    try:
+        set_last_message(
+            keys=[LAST_MESSAGE_KEY.format(chat_id=chat_id)],
+            args=[message_id, LAST_MESSAGE_TTL]
+        )
+    except redis.RedisError as e:
+        print(f"Не удалось сохранить последнее сообщение чата: {e}")
+
+
+def get_last_message_id(chat_id: int) -> Optional[int]:
+    """Возвращает ID последнего сообщения чата или None, если он неизвестен."""
+    try:
+        value = redis_client.get(LAST_MESSAGE_KEY.format(chat_id=chat_id))
+    except redis.RedisError:
+        return None
+    return int(value) if value else None
+
+
+def forget_last_message(chat_id: int):
+    try:
+        redis_client.delete(LAST_MESSAGE_KEY.format(chat_id=chat_id))
+    except redis.RedisError as e:
+        print(f"Не удалось удалить последнее сообщение чата {chat_id}: {e}")
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+import time
+import uuid
+import zlib
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import Row
+
+from core.config import settings
+from core.redis import redis_client
+from db.crud import iter_chat_messages
+from db.database import SessionLocal
+
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+CSV_HEADER = ["id", "sender_id", "content", "timestamp"]
+
+
+def _ndjson(batches: Iterable[List[Row]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(
+            json.dumps({
+                "id": row.id,
+                "sender_id": row.sender_id,
+                "content": row.content,
+                "timestamp": row.timestamp.isoformat()
+                if row.timestamp else None,
+            }, ensure_ascii=False) + "\n"
+            for row in batch
+        )
+
+
+def _csv(batches: Iterable[List[Row]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                row.id,
+                row.sender_id,
+                row.content,
+                row.timestamp.isoformat() if row.timestamp else "",
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_filename(chat_id: int, fmt: str, compress: bool) -> str:
+    return f"chat_{chat_id}.{fmt}" + (".gz" if compress else "")
+
+
+def iter_chat_export(
+    chat_id: int,
+    fmt: str,
+    compress: bool = False
+) -> Iterator[bytes]:
+    """Генерирует экспорт чата в NDJSON или CSV по частям.
+
+    Сессия открывается внутри генератора и живёт, пока идёт отдача:
+    сессия запроса закрывается раньше, чем StreamingResponse начнёт
+    читать данные.
+    """
+    with SessionLocal() as db:
+        batches = iter_chat_messages(db, chat_id, settings.EXPORT_BATCH_SIZE)
+        chunks = _ndjson(batches) if fmt == "ndjson" else _csv(batches)
+        encoded = (chunk.encode("utf-8") for chunk in chunks)
+        yield from _gzip(encoded) if compress else encoded
+
+
+EXPORT_KEY = "export:{export_id}"
+
+
+def export_path(export_id: str, chat_id: int, fmt: str, compress: bool):
+    return os.path.join(
+        settings.EXPORT_DIR,
+        f"{export_id}_{export_filename(chat_id, fmt, compress)}"
+    )
+
+
+def write_chat_export(
+    export_id: str,
+    chat_id: int,
+    fmt: str,
+    compress: bool
+) -> str:
+    """Пишет экспорт чата в файл и возвращает путь к нему.
+
+    Данные сначала пишутся во временный файл, уникальный для каждой
+    попытки, который переименовывается после завершения, поэтому
+    незаконченный экспорт не попадёт к пользователю, а две попытки
+    не пишут в один файл.
+    """
+    path = export_path(export_id, chat_id, fmt, compress)
+    part_path = f"{path}.{uuid.uuid4().hex}.part"
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    try:
+        with open(part_path, "wb") as file:
+            for chunk in iter_chat_export(chat_id, fmt, compress):
+                file.write(chunk)
+        os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return path
+
+
+def set_export_status(export_id: str, **fields):
+    key = EXPORT_KEY.format(export_id=export_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(key, mapping=fields)
+    pipe.expire(key, settings.EXPORT_TTL)
+    pipe.execute()
+
+
+def get_export_status(export_id: str) -> dict:
+    return redis_client.hgetall(EXPORT_KEY.format(export_id=export_id))
+
+
+def cleanup_stale_exports() -> int:
+    """Удаляет файлы экспорта старше EXPORT_TTL.
+
+    К этому времени статус экспорта в Redis уже истёк, и скачать файл
+    всё равно нельзя. Ошибки отдельных файлов (например, файл удалён
+    параллельно) не прерывают очистку.
+    """
+    if not os.path.isdir(settings.EXPORT_DIR):
+        return 0
+    removed = 0
+    deadline = time.time() - settings.EXPORT_TTL
+    for entry in os.scandir(settings.EXPORT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                removed += 1
+        except OSError as e:
+            print(f"Не удалось удалить файл экспорта {entry.path}: {e}")
+    return removed
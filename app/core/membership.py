@@ -0,0 +1,74 @@
+from typing import FrozenSet, Optional
+
+import redis
+from sqlalchemy.orm import Session
+
+from core.cache import LRUCache
+from core.config import settings
+from core.redis import redis_client
+from db.models import ChatMember
+
+
+MEMBERS_KEY = "chat:{chat_id}:members"
+
+members_cache = LRUCache(
+    maxsize=settings.MEMBERSHIP_CACHE_SIZE,
+    ttl=settings.MEMBERSHIP_CACHE_TTL
+)
+
+
+def _load_members(db: Session, chat_id: int) -> Optional[FrozenSet[int]]:
+    rows = db.query(ChatMember.user_id).filter(
+        ChatMember.chat_id == chat_id).all()
+    if not rows:
+        return None
+    return frozenset(user_id for user_id, in rows)
+
+
+def get_chat_members(db: Session, chat_id: int) -> Optional[FrozenSet[int]]:
+    """Возвращает множество участников чата или None, если чата нет.
+
+    Участники ищутся сначала в кеше процесса, затем в Redis-ключе
+    chat:{chat_id}:members (ID через запятую, живёт
+    MEMBERSHIP_REDIS_TTL секунд) и только потом в БД одним запросом
+    по первичному ключу chat_members. Отсутствующие чаты не кешируются.
+    """
+    members = members_cache.get(chat_id)
+    if members is not None:
+        return members
+
+    try:
+        cached = redis_client.get(MEMBERS_KEY.format(chat_id=chat_id))
+    except redis.RedisError:
+        cached = None
+    if cached:
+        members = frozenset(int(user_id) for user_id in cached.split(","))
+    else:
+        members = _load_members(db, chat_id)
+        if members is None:
+            return None
+        try:
+            redis_client.set(
+                MEMBERS_KEY.format(chat_id=chat_id),
+                ",".join(map(str, sorted(members))),
+                ex=settings.MEMBERSHIP_REDIS_TTL
+            )
+        except redis.RedisError:
+            pass
+
+    members_cache.set(chat_id, members)
+    return members
+
+
+def is_chat_member(db: Session, chat_id: int, user_id: int) -> bool:
+    members = get_chat_members(db, chat_id)
+    return members is not None and user_id in members
+
+
+def invalidate_chat_members(chat_id: int):
+    """Сбрасывает закешированных участников чата."""
+    members_cache.delete(chat_id)
+    try:
+        redis_client.delete(MEMBERS_KEY.format(chat_id=chat_id))
+    except redis.RedisError as e:
+        print(f"Не удалось сбросить участников чата {chat_id}: {e}")
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import redis
+
+from core.config import settings
+from core.redis import redis_client
+
+
+STATS_KEY = "notifications:stats:{day}"
+FAILURES_KEY = "notifications:failures:{day}"
+
+SENT = "sent"
+RETRIED = "retried"
+FAILED = "failed"
+DEAD_LETTERED = "dead_lettered"
+
+
+def _day(moment: datetime = None) -> str:
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+def record_notification(
+    outcome: str,
+    telegram_id: int = None,
+    error: str = None
+):
+    """Учитывает исход отправки уведомления в дневных счётчиках.
+
+    Успешные отправки только увеличивают счётчик. Для ошибок ещё
+    сохраняется короткая запись в ограниченном списке последних сбоев.
+    """
+    day = _day()
+    stats_key = STATS_KEY.format(day=day)
+    ttl = settings.NOTIFICATION_STATS_TTL_DAYS * 24 * 3600
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hincrby(stats_key, outcome, 1)
+        pipe.expire(stats_key, ttl)
+        if error is not None:
+            failures_key = FAILURES_KEY.format(day=day)
+            entry = (
+                f"{datetime.utcnow().isoformat(timespec='seconds')} "
+                f"{outcome} {telegram_id} {error[:200]}"
+            )
+            pipe.lpush(failures_key, entry)
+            pipe.ltrim(
+                failures_key, 0, settings.NOTIFICATION_FAILURES_KEPT - 1
+            )
+            pipe.expire(failures_key, ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Не удалось записать статистику уведомлений: {e}")
+
+
+def get_notification_stats(days: int = 7) -> list:
+    """Возвращает статистику доставки за последние `days` дней."""
+    today = datetime.utcnow()
+    day_list = [_day(today - timedelta(days=i)) for i in range(days)]
+    pipe = redis_client.pipeline(transaction=False)
+    for day in day_list:
+        pipe.hgetall(STATS_KEY.format(day=day))
+        pipe.lrange(FAILURES_KEY.format(day=day), 0, -1)
+    results = pipe.execute()
+    return [
+        {
+            "day": day,
+            "counts": {
+                name: int(count)
+                for name, count in results[2 * i].items()
+            },
+            "recent_failures": results[2 * i + 1],
+        }
+        for i, day in enumerate(day_list)
+    ]
@@ -0,0 +1,62 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+def process_started() -> float:
+    """Момент запуска процесса по часам perf_counter.
+
+    Возраст процесса берётся из /proc (Linux); если его прочитать не
+    удалось, отсчёт идёт с текущего момента.
+    """
+    try:
+        with open("/proc/self/stat") as file:
+            # Поля после имени процесса начинаются с третьего,
+            # starttime — двадцать второе.
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+        age = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter()
+    return time.perf_counter() - max(0.0, age)
+
+
+class StartupProfile:
+    """Замеряет длительность этапов запуска процесса.
+
+    Отсчёт идёт с запуска процесса, поэтому первый этап включает старт
+    интерпретатора и импорты, сделанные до этого модуля (например,
+    самого celery при запуске через CLI).
+    """
+
+    def __init__(self):
+        self.started = process_started()
+        self._last = self.started
+        self.steps: List[Tuple[str, float]] = []
+
+    def mark(self, name: str):
+        """Записывает время, прошедшее с предыдущей отметки."""
+        now = time.perf_counter()
+        self.steps.append((name, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def step(self, name: str):
+        """Замеряет время выполнения блока."""
+        self._last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    def report(self) -> str:
+        lines = [f"  {name}: {duration * 1000:.1f} мс"
+                 for name, duration in self.steps]
+        total = time.perf_counter() - self.started
+        lines.append(f"  всего: {total * 1000:.1f} мс")
+        return "Профиль запуска:\n" + "\n".join(lines)
+
+
+startup_profile = StartupProfile()
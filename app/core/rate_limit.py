@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import Counter
+from typing import Tuple
+
+import redis
+from fastapi import Depends, HTTPException, Request, status
+
+from core.auth import get_current_user
+from core.cache import LRUCache
+from core.config import settings
+from core.redis import redis_client
+from db.models import User
+
+
+THROTTLED_KEY = "rate_limit:throttled"
+LOCAL_BUCKETS_MAX = 10000
+
+# Атомарный token bucket: пополнение, списание и TTL за один вызов.
+# Время берётся из Redis, чтобы все воркеры работали по одним часам.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+token_bucket = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+throttled_counts: Counter = Counter()
+
+
+def parse_limit(spec: str) -> Tuple[float, int]:
+    """Разбирает лимит вида "30/10" в (скорость в секунду, ёмкость)."""
+    requests, seconds = spec.split("/")
+    capacity = int(requests)
+    return capacity / float(seconds), capacity
+
+
+class RateLimiter:
+    """Ограничитель частоты запросов на основе token bucket.
+
+    Основное состояние хранится в Redis. Локальные корзины процесса
+    видят только часть общего трафика, поэтому пустая локальная корзина
+    означает и пустую общую: такой запрос отклоняется без обращения
+    к Redis. При недоступности Redis решение принимается локально.
+
+    Локальные корзины живут capacity / rate секунд: за это время
+    корзина заполнилась бы снова, так что вытеснение её не меняет.
+    """
+
+    def __init__(self, name: str, spec: str):
+        self.name = name
+        self.rate, self.capacity = parse_limit(spec)
+        self._local = LRUCache(
+            maxsize=LOCAL_BUCKETS_MAX, ttl=self.capacity / self.rate
+        )
+        self._lock = threading.Lock()
+
+    def _take_local(self, key: str) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._local.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - ts) * self.rate)
+            if tokens >= 1:
+                self._local.set(key, (tokens - 1, now))
+                return True, 0.0
+            self._local.set(key, (tokens, now))
+            return False, (1 - tokens) / self.rate
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """Списывает токен для ключа.
+
+        Возвращает признак разрешения и время до следующей попытки.
+        """
+        if not settings.RATE_LIMIT_ENABLED:
+            return True, 0.0
+
+        allowed, retry_after = self._take_local(key)
+        if allowed:
+            try:
+                result = token_bucket(
+                    keys=[f"rate_limit:{self.name}:{key}"],
+                    args=[self.rate, self.capacity, 1]
+                )
+                allowed, retry_after = bool(int(result[0])), float(result[1])
+            except redis.RedisError as e:
+                print(f"Ошибка rate limiter {self.name}: {e}")
+
+        if not allowed:
+            record_throttled(self.name)
+        return allowed, retry_after
+
+
+def record_throttled(name: str):
+    """Увеличивает счётчики отклонённых запросов."""
+    throttled_counts[name] += 1
+    try:
+        redis_client.hincrby(THROTTLED_KEY, name, 1)
+    except redis.RedisError:
+        pass
+
+
+def get_throttled_stats() -> dict:
+    """Возвращает счётчики отклонённых запросов по процессу и в целом."""
+    try:
+        total = {
+            name: int(count)
+            for name, count in redis_client.hgetall(THROTTLED_KEY).items()
+        }
+    except redis.RedisError:
+        total = None
+    return {"process": dict(throttled_counts), "total": total}
+
+
+ws_user_limiter = RateLimiter("ws_user", settings.RATE_LIMIT_WS_USER)
+ws_chat_limiter = RateLimiter("ws_chat", settings.RATE_LIMIT_WS_CHAT)
+ws_event_limiter = RateLimiter("ws_event", settings.RATE_LIMIT_WS_EVENTS)
+login_limiter = RateLimiter("login", settings.RATE_LIMIT_LOGIN)
+register_limiter = RateLimiter("register", settings.RATE_LIMIT_REGISTER)
+history_limiter = RateLimiter("history", settings.RATE_LIMIT_HISTORY)
+
+
+def check_limit(limiter: RateLimiter, key: str):
+    """Выбрасывает 429, если лимит для ключа исчерпан."""
+    allowed, retry_after = limiter.hit(key)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много запросов, попробуйте позже",
+            headers={"Retry-After": str(max(1, round(retry_after)))}
+        )
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_login(request: Request):
+    check_limit(login_limiter, client_ip(request))
+
+
+async def limit_register(request: Request):
+    check_limit(register_limiter, client_ip(request))
+
+
+async def limit_history(current_user: User = Depends(get_current_user)):
+    check_limit(history_limiter, str(current_user.id))
@@ -3,6 +3,7 @@ import redis
 from core.config import settings
 
 
+# Клиент подключается к Redis лениво, при первой команде.
 redis_client = redis.StrictRedis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
@@ -11,11 +12,16 @@ redis_client = redis.StrictRedis(
     decode_responses=True
 )
 
-try:
-    redis_client.ping()
-    print(
-        "Connection to Redis successful: "
-        f"{settings.REDIS_HOST}:{settings.REDIS_PORT}"
-    )
-except redis.ConnectionError as e:
-    print(f"Error connecting to Redis: {e}")
+
+def ping_redis() -> bool:
+    """Проверяет доступность Redis, не прерывая запуск при ошибке."""
+    try:
+        redis_client.ping()
+        print(
+            "Connection to Redis successful: "
+            f"{settings.REDIS_HOST}:{settings.REDIS_PORT}"
+        )
+        return True
+    except redis.RedisError as e:
+        print(f"Error connecting to Redis: {e}")
+        return False
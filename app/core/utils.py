@@ -21,3 +21,10 @@ def serialize_message(message):
         if isinstance(value, datetime):
             message_dict[key] = value.isoformat()
     return message_dict
+
+
+def truncate_preview(text: str, limit: int) -> str:
+    """Обрезает текст до limit символов, добавляя многоточие."""
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + "…"
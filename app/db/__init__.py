@@ -1 +1,2 @@
-from db.models import User, Chat, Message  # noqa
+from db.models import (  # noqa
+        User, Chat, ChatMember, Message, Attachment, NotificationOutbox)
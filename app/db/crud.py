@@ -1,10 +1,26 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import redis
+from sqlalchemy import Row, String, delete, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from db.models import User, Chat, Message
+from db.models import (
+        User, Chat, ChatMember, Message, Attachment, NotificationOutbox)
 from db.schemas import UserCreate, MessageCreate
+from core.config import settings
+from core.events import (
+        record_last_message, get_last_message_id, forget_last_message)
+from core.redis import redis_client
 from core.utils import hash_password
 
 
+# Общий для всех процессов кеш "пара пользователей -> ID личного чата":
+# удаление чата сбрасывает его сразу везде.
+CHAT_PAIR_KEY = "chat:pair:{user1_id}:{user2_id}"
+
+
 def create_user(db: Session, user: UserCreate) -> User:
     """Создаёт нового пользователя в базе данных."""
     hashed_password = hash_password(user.password)
@@ -19,43 +35,289 @@ def create_user(db: Session, user: UserCreate) -> User:
     return db_user
 
 
-def get_or_create_chat(db: Session, user1_id: int, user2_id: int) -> Chat:
+def chat_pair(user1_id: int, user2_id: int) -> Tuple[int, int]:
+    """Возвращает пару участников в каноническом порядке (min, max)."""
+    return min(user1_id, user2_id), max(user1_id, user2_id)
+
+
+def get_or_create_chat_id(
+    db: Session,
+    user1_id: int,
+    user2_id: int
+) -> Optional[int]:
     """Находит существующий чат между двумя пользователями или
-    создаёт новый.
+    создаёт новый и возвращает его ID.
+
+    Поиск, вставка чата и его участников выполняются одним запросом
+    INSERT ... ON CONFLICT DO NOTHING, поэтому одновременные вызовы
+    не приводят к IntegrityError. Возвращает None, если одного из
+    пользователей не существует.
     """
-    chat = db.query(Chat).filter(
-        ((Chat.user1_id == user1_id) & (Chat.user2_id == user2_id)) |
-        ((Chat.user1_id == user2_id) & (Chat.user2_id == user1_id))
-    ).first()
-    if not chat:
-        chat = Chat(user1_id=user1_id, user2_id=user2_id)
-        db.add(chat)
+    pair = chat_pair(user1_id, user2_id)
+    key = CHAT_PAIR_KEY.format(user1_id=pair[0], user2_id=pair[1])
+    try:
+        cached = redis_client.get(key)
+    except redis.RedisError:
+        cached = None
+    if cached:
+        return int(cached)
+
+    inserted = pg_insert(Chat).values(
+        user1_id=pair[0], user2_id=pair[1]
+    ).on_conflict_do_nothing(
+        constraint="_user_pair_uc"
+    ).returning(Chat.id).cte("inserted")
+    members = insert(ChatMember).from_select(
+        ["chat_id", "user_id"],
+        select(inserted.c.id, User.id).where(User.id.in_(pair))
+    ).cte("members")
+    existing = select(Chat.id).where(
+        Chat.user1_id == pair[0], Chat.user2_id == pair[1]
+    )
+    try:
+        chat_id = db.execute(
+            select(inserted.c.id).union_all(existing).limit(1).add_cte(
+                members
+            )
+        ).scalar()
         db.commit()
-        db.refresh(chat)
+    except IntegrityError:
+        db.rollback()
+        return None
+
+    if chat_id is None:
+        # Конфликтующая строка закоммичена другой транзакцией уже после
+        # снимка нашего запроса: теперь она видна обычному SELECT.
+        chat_id = db.execute(existing).scalar()
+    try:
+        redis_client.set(key, chat_id, ex=settings.CHAT_CACHE_TTL)
+    except redis.RedisError:
+        pass
+    return chat_id
+
+
+def forget_chat(user1_id: int, user2_id: int):
+    """Удаляет пару из кеша чатов."""
+    pair = chat_pair(user1_id, user2_id)
+    try:
+        redis_client.delete(
+            CHAT_PAIR_KEY.format(user1_id=pair[0], user2_id=pair[1])
+        )
+    except redis.RedisError as e:
+        print(f"Не удалось сбросить кеш чата {pair}: {e}")
+
+
+def add_chat_members(
+    db: Session,
+    chat_id: int,
+    user_ids: Iterable[int]
+) -> int:
+    """Добавляет в чат существующих пользователей из списка.
+
+    Несуществующие ID и уже состоящие в чате пользователи пропускаются.
+    Вставка выполняется одним INSERT ... SELECT без коммита.
+    Возвращает число добавленных участников.
+    """
+    result = db.execute(
+        pg_insert(ChatMember).from_select(
+            ["chat_id", "user_id"],
+            select(literal(chat_id), User.id).where(
+                User.id.in_(set(user_ids))
+            )
+        ).on_conflict_do_nothing()
+    )
+    return result.rowcount
+
+
+def remove_chat_member(db: Session, chat_id: int, user_id: int) -> bool:
+    """Удаляет пользователя из участников чата без коммита."""
+    result = db.execute(
+        delete(ChatMember).where(
+            ChatMember.chat_id == chat_id, ChatMember.user_id == user_id
+        )
+    )
+    return result.rowcount > 0
+
+
+def create_group_chat(
+    db: Session,
+    name: str,
+    creator_id: int,
+    member_ids: Iterable[int]
+) -> Chat:
+    """Создаёт групповой чат, владельцем которого становится создатель."""
+    chat = Chat(name=name, is_group=True, owner_id=creator_id)
+    db.add(chat)
+    db.flush()
+    add_chat_members(db, chat.id, {creator_id, *member_ids})
+    db.commit()
+    db.refresh(chat)
     return chat
 
 
+def delete_chat_with_messages(db: Session, chat_id: int):
+    """Удаляет чат, его участников и сообщения.
+
+    Для личного чата сбрасывает пару в кеше чатов.
+    """
+    db.execute(delete(Message).where(Message.chat_id == chat_id))
+    db.execute(delete(ChatMember).where(ChatMember.chat_id == chat_id))
+    pair = db.execute(
+        delete(Chat).where(Chat.id == chat_id).returning(
+            Chat.user1_id, Chat.user2_id
+        )
+    ).first()
+    db.commit()
+    forget_last_message(chat_id)
+    if pair is not None and pair.user1_id is not None:
+        forget_chat(pair.user1_id, pair.user2_id)
+
+
+def enqueue_notifications(
+    db: Session,
+    chat_id: int,
+    sender_id: int,
+    text: str,
+    skip_user_ids: Iterable[int] = ()
+):
+    """Добавляет в outbox уведомления для участников чата с Telegram.
+
+    Получатели выбираются и записываются одним INSERT ... SELECT
+    в текущей транзакции независимо от размера чата. Пользователи из
+    `skip_user_ids` (например, находящиеся в сети) пропускаются.
+    """
+    recipients = select(
+        User.telegram_id, literal(text, type_=String)
+    ).join(
+        ChatMember, ChatMember.user_id == User.id
+    ).where(
+        ChatMember.chat_id == chat_id,
+        User.id != sender_id,
+        User.telegram_id.isnot(None)
+    )
+    skip_user_ids = set(skip_user_ids)
+    if skip_user_ids:
+        recipients = recipients.where(User.id.notin_(skip_user_ids))
+    db.execute(
+        insert(NotificationOutbox).from_select(
+            ["telegram_id", "text"], recipients
+        )
+    )
+
+
 def create_message(
     db: Session,
     chat_id: int,
     sender_id: int,
-    message_data: MessageCreate
+    message_data: MessageCreate,
+    notification_text: str = None,
+    online_user_ids: Iterable[int] = ()
 ) -> Message:
-    """Создаёт новое сообщение и сохраняет его в базе данных."""
+    """Создаёт новое сообщение и сохраняет его в базе данных.
+
+    Если передан `notification_text`, уведомления участникам не из
+    `online_user_ids` записываются в outbox в той же транзакции.
+    """
     db_message = Message(
         chat_id=chat_id,
         sender_id=sender_id,
-        content=message_data.content
+        content=message_data.content,
+        attachment_id=message_data.attachment_id
     )
     db.add(db_message)
+    if notification_text is not None:
+        enqueue_notifications(
+            db, chat_id, sender_id, notification_text, online_user_ids
+        )
     db.commit()
     db.refresh(db_message)
+    record_last_message(chat_id, db_message.id)
     return db_message
 
 
+def is_readable_message(db: Session, chat_id: int, message_id: int) -> bool:
+    """Проверяет, что курсор прочтения не уходит дальше сообщений чата.
+
+    Курсор сравнивается с ID последнего сообщения из Redis, который
+    общий для всех процессов и обновляется при каждом сообщении. В БД
+    (поиск по первичному ключу) идём, только если чат не писал дольше
+    LAST_MESSAGE_TTL или Redis недоступен.
+    """
+    last_message_id = get_last_message_id(chat_id)
+    if last_message_id is not None:
+        return message_id <= last_message_id
+    found = db.query(Message.id).filter(
+        Message.id == message_id, Message.chat_id == chat_id).first()
+    return found is not None
+
+
 def get_messages(db: Session, chat_id: int):
     """Возвращает сообщения для определённого чата,
     отсортированные по времени.
     """
     return db.query(Message).filter(
         Message.chat_id == chat_id).order_by(Message.timestamp).all()
+
+
+def iter_chat_messages(
+    db: Session,
+    chat_id: int,
+    batch_size: int
+) -> Iterator[List[Row]]:
+    """Отдаёт сообщения чата пачками через серверный курсор.
+
+    Строки содержат только нужные для экспорта колонки, поэтому память
+    не зависит от размера чата.
+    """
+    result = db.execute(
+        select(
+            Message.id, Message.sender_id, Message.content, Message.timestamp
+        ).where(
+            Message.chat_id == chat_id
+        ).order_by(
+            Message.timestamp, Message.id
+        ).execution_options(yield_per=batch_size)
+    )
+    yield from result.partitions()
+
+
+def create_attachment(
+    db: Session,
+    sha256: str,
+    size: int,
+    filename: str,
+    content_type: str,
+    uploader_id: int
+) -> Attachment:
+    """Сохраняет метаданные загруженного вложения."""
+    attachment = Attachment(
+        sha256=sha256,
+        size=size,
+        filename=filename,
+        content_type=content_type,
+        uploader_id=uploader_id
+    )
+    db.add(attachment)
+    db.commit()
+    db.refresh(attachment)
+    return attachment
+
+
+def get_accessible_attachment(
+    db: Session,
+    attachment_id: int,
+    user_id: int
+) -> Optional[Attachment]:
+    """Возвращает вложение, если пользователь его загрузил или состоит
+    в чате, где оно было отправлено.
+    """
+    shared = select(Message.id).join(
+        ChatMember, ChatMember.chat_id == Message.chat_id
+    ).where(
+        Message.attachment_id == Attachment.id,
+        ChatMember.user_id == user_id
+    ).exists()
+    return db.query(Attachment).filter(
+        Attachment.id == attachment_id,
+        (Attachment.uploader_id == user_id) | shared
+    ).first()
@@ -1,7 +1,8 @@
 from datetime import datetime
 
 from sqlalchemy import (
-        Column, Integer, String, ForeignKey, DateTime, UniqueConstraint)
+        Column, Integer, String, Boolean, ForeignKey, DateTime,
+        UniqueConstraint, CheckConstraint, func, false)
 from sqlalchemy.orm import relationship
 
 from db.database import Base
@@ -19,20 +20,54 @@ class User(Base):
 
 
 class Chat(Base):
-    """Модель чата, связывающая двух пользователей."""
+    """Модель чата.
+
+    Участники любого чата хранятся в chat_members. Для личных чатов
+    дополнительно заполняется пара user1_id <= user2_id, по которой
+    чат находится без дублей; у групповых чатов она пустая. Удалять
+    групповой чат и управлять его участниками может только владелец.
+    """
     __tablename__ = "chats"
 
     id = Column(Integer, primary_key=True, index=True)
-    user1_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    user2_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user1_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    user2_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    name = Column(String, nullable=True)
+    is_group = Column(
+        Boolean, default=False, server_default=false(), nullable=False
+    )
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
     __table_args__ = (
         UniqueConstraint('user1_id', 'user2_id', name='_user_pair_uc'),
+        CheckConstraint('user1_id <= user2_id', name='_user_pair_order_ck'),
     )
 
     user1 = relationship("User", foreign_keys=[user1_id])
     user2 = relationship("User", foreign_keys=[user2_id])
+    owner = relationship("User", foreign_keys=[owner_id])
     messages = relationship("Message", back_populates="chat")
+    members = relationship(
+        "ChatMember", back_populates="chat", cascade="all, delete-orphan"
+    )
+
+
+class ChatMember(Base):
+    """Участник чата."""
+    __tablename__ = "chat_members"
+
+    chat_id = Column(
+        Integer,
+        ForeignKey("chats.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    user_id = Column(
+        Integer, ForeignKey("users.id"), primary_key=True, index=True
+    )
+    joined_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    chat = relationship("Chat", back_populates="members")
+    user = relationship("User")
 
 
 class Message(Base):
@@ -44,6 +79,42 @@ class Message(Base):
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    attachment_id = Column(
+        Integer, ForeignKey("attachments.id"), nullable=True, index=True
+    )
 
     chat = relationship("Chat", back_populates="messages")
     sender = relationship("User", foreign_keys=[sender_id])
+    attachment = relationship("Attachment")
+
+
+class Attachment(Base):
+    """Вложение, загруженное пользователем.
+
+    Содержимое хранится в локальном хранилище блобов по SHA-256, поэтому
+    одинаковые файлы занимают место один раз. Сообщения ссылаются на
+    вложение только по ID.
+    """
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class NotificationOutbox(Base):
+    """Уведомление, ожидающее публикации в брокер Celery.
+
+    Записывается в той же транзакции, что и сообщение, и удаляется
+    после успешной публикации ретранслятором.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(Integer, nullable=False)
+    text = Column(String, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
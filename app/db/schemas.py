@@ -1,6 +1,9 @@
 from datetime import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+
+from core.config import settings
 
 
 class UserCreate(BaseModel):
@@ -29,16 +32,31 @@ class LoginRequest(BaseModel):
 class ChatOut(BaseModel):
     """Схема для отображения данных чата."""
     id: int
-    user1_id: int
-    user2_id: int
+    user1_id: Optional[int] = None
+    user2_id: Optional[int] = None
+    name: Optional[str] = None
+    is_group: bool = False
+    owner_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class GroupChatCreate(BaseModel):
+    """Схема для создания группового чата."""
+    name: str
+    member_ids: List[int] = []
+
+
+class ChatMembersAdd(BaseModel):
+    """Схема для добавления участников в чат."""
+    user_ids: List[int]
+
+
 class MessageCreate(BaseModel):
     """Схема для создания сообщения."""
-    content: str
+    content: str = Field(max_length=settings.MAX_MESSAGE_LENGTH)
+    attachment_id: Optional[int] = None
 
 
 class MessageOut(BaseModel):
@@ -48,6 +66,26 @@ class MessageOut(BaseModel):
     sender_id: int
     content: str
     timestamp: datetime
+    attachment_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class UploadCreate(BaseModel):
+    """Схема для начала загрузки вложения."""
+    filename: str = Field(max_length=255)
+    content_type: str = "application/octet-stream"
+    size: int = Field(gt=0)
+
+
+class AttachmentOut(BaseModel):
+    """Схема для отображения данных вложения."""
+    id: int
+    sha256: str
+    size: int
+    filename: str
+    content_type: str
 
     class Config:
         from_attributes = True
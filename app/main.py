@@ -1,30 +1,99 @@
+# Импортируется первым, чтобы профиль запуска учёл все импорты.
+from core.profiling import startup_profile
+
 import asyncio
-from typing import Dict, List
+import hmac
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Set
 import json
 
 from fastapi import (
     FastAPI, Depends, WebSocket, WebSocketDisconnect,
-    HTTPException, status, Request, Query)
+    HTTPException, status, Request, Query, Header)
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
+from redis import RedisError
 
 from db import models
 from db.crud import (
-        create_user, get_or_create_chat, create_message, get_messages)
-from db.database import SessionLocal, engine
+        create_user, get_or_create_chat_id, chat_pair, create_group_chat,
+        add_chat_members, remove_chat_member, delete_chat_with_messages,
+        create_message,
+        get_messages, create_attachment, get_accessible_attachment,
+        is_readable_message)
+from db.database import SessionLocal
 from db.models import User
 from db.schemas import (
-        UserCreate, UserOut, LoginRequest, MessageCreate, MessageOut)
-from celery_tasks.tasks import send_notification_task, test_celery_task
+        UserCreate, UserOut, LoginRequest, MessageCreate, MessageOut,
+        ChatOut, GroupChatCreate, ChatMembersAdd, UploadCreate,
+        AttachmentOut)
+from celery_tasks.tasks import test_celery_task, export_chat_task
+from celery_tasks.outbox import relay_outbox_batch
 from core.auth import (
-        create_access_token, get_current_user, SECRET_KEY, ALGORITHM)
-from core.utils import verify_password, serialize_message
-from core.redis import redis_client
-from telegram.bot import start_bot
+        create_access_token, get_current_user, get_admin_user,
+        SECRET_KEY, ALGORITHM)
+from core.rate_limit import (
+        limit_login, limit_register, limit_history,
+        ws_user_limiter, ws_chat_limiter, ws_event_limiter,
+        get_throttled_stats)
+from core.utils import (
+        verify_password, serialize_message, truncate_preview)
+from core.blobs import (
+        UploadError, start_upload, get_upload, append_chunk, finish_upload,
+        blob_path, cleanup_stale_uploads)
+from core.config import settings
+from core.redis import redis_client, ping_redis
+from core.membership import (
+        get_chat_members, is_chat_member, invalidate_chat_members)
+from core.notification_stats import get_notification_stats
+from core.events import (
+        MESSAGE, READ, PRESENCE, EPHEMERAL_TYPES, parse_event, coalesce_event,
+        flush_event, outbound_event, error_event, get_read_cursors,
+        clear_read_cursors)
+from core.export import (
+        MEDIA_TYPES, iter_chat_export, export_filename, set_export_status,
+        get_export_status, cleanup_stale_exports)
+
+
+startup_profile.mark("импорт модулей приложения")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Поднимает ресурсы приложения при старте и освобождает их.
+
+    Схему БД создают миграции Alembic. Недоступность Redis при старте
+    не прерывает запуск: клиент переподключится при первой команде.
+    """
+    with startup_profile.step("проверка Redis"):
+        ping_redis()
+
+    background_tasks = [
+        asyncio.create_task(cleanup_inactive_chats()),
+        asyncio.create_task(relay_outbox()),
+    ]
+    if settings.TELEGRAM_MODE != "off":
+        with startup_profile.step("импорт Telegram-бота"):
+            from telegram.bot import start_bot
+        background_tasks.append(asyncio.create_task(start_bot()))
+
+    print(startup_profile.report())
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if settings.TELEGRAM_MODE != "off":
+        from telegram.bot import close_bot
+        await close_bot()
 
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Messaging Service API",
     description=(
         "API для обмена сообщениями в реальном времени с "
@@ -39,8 +108,9 @@ app = FastAPI(
         "url": "https://opensource.org/licenses/MIT",
     }
 )
-models.Base.metadata.create_all(bind=engine)
 connected_clients: Dict[int, List[WebSocket]] = {}
+flush_tasks: Set[asyncio.Task] = set()
+outbox_ready = asyncio.Event()
 templates = Jinja2Templates(directory="/app/templates")
 
 
@@ -59,13 +129,17 @@ async def get_chat_page(request: Request):
     return templates.TemplateResponse("chat.html", {"request": request})
 
 
-@app.post("/register/", response_model=UserOut)
+@app.post(
+    "/register/",
+    response_model=UserOut,
+    dependencies=[Depends(limit_register)]
+)
 async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Регистрация нового пользователя."""
     return create_user(db=db, user=user)
 
 
-@app.post("/login/")
+@app.post("/login/", dependencies=[Depends(limit_login)])
 async def login(user: LoginRequest, db: Session = Depends(get_db)):
     """Авторизация пользователя и выдача JWT-токена."""
     db_user = db.query(User).filter(User.username == user.username).first()
@@ -95,22 +169,188 @@ async def get_users(
     ]
 
 
-@app.get("/chats/{chat_id}/messages/")
+def require_chat_member(db: Session, chat_id: int, user_id: int):
+    """Выбрасывает 404/403, если чата нет или пользователь не участник."""
+    members = get_chat_members(db, chat_id)
+    if members is None:
+        raise HTTPException(status_code=404, detail="Чат не найден")
+    if user_id not in members:
+        raise HTTPException(status_code=403, detail="Нет доступа к чату")
+
+
+@app.get(
+    "/chats/{chat_id}/messages/",
+    dependencies=[Depends(limit_history)]
+)
 async def get_chat_messages(
     chat_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Получает историю сообщений для указанного чата."""
-    chat = db.query(models.Chat).filter(models.Chat.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=404, detail="Чат с таким ID не найден")
-    if current_user.id not in {chat.user1_id, chat.user2_id}:
-        raise HTTPException(status_code=403, detail="Нет доступа к чату")
+    require_chat_member(db, chat_id, current_user.id)
     return get_messages(db=db, chat_id=chat_id)
 
 
-@app.get("/chats/get_or_create/{user_id}")
+@app.get("/chats/{chat_id}/export")
+async def export_chat(
+    chat_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Потоково выгружает историю чата в NDJSON или CSV."""
+    require_chat_member(db, chat_id, current_user.id)
+    filename = export_filename(chat_id, format, gzip)
+    return StreamingResponse(
+        iter_chat_export(chat_id, format, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.post("/chats/{chat_id}/exports/", status_code=status.HTTP_202_ACCEPTED)
+async def start_chat_export(
+    chat_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Запускает фоновый экспорт чата в файл."""
+    require_chat_member(db, chat_id, current_user.id)
+    export_id = uuid.uuid4().hex
+    set_export_status(
+        export_id,
+        status="pending",
+        chat_id=chat_id,
+        user_id=current_user.id,
+        filename=export_filename(chat_id, format, gzip)
+    )
+    export_chat_task.delay(export_id, chat_id, format, gzip)
+    return {"export_id": export_id, "status": "pending"}
+
+
+@app.get("/exports/{export_id}")
+async def get_chat_export(
+    export_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Возвращает статус фонового экспорта или готовый файл."""
+    export = get_export_status(export_id)
+    if not export or int(export["user_id"]) != current_user.id:
+        raise HTTPException(status_code=404, detail="Экспорт не найден")
+    if export["status"] != "ready" or not os.path.exists(export["path"]):
+        return {
+            "export_id": export_id,
+            "status": export["status"],
+            "error": export.get("error"),
+        }
+    return FileResponse(export["path"], filename=export["filename"])
+
+
+@app.post("/attachments/uploads/", status_code=status.HTTP_201_CREATED)
+async def start_attachment_upload(
+    upload: UploadCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Начинает загрузку вложения частями."""
+    try:
+        upload_id = start_upload(
+            current_user.id, upload.filename, upload.content_type, upload.size
+        )
+    except UploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    return {
+        "upload_id": upload_id,
+        "chunk_size": settings.ATTACHMENT_CHUNK_BYTES,
+    }
+
+
+def get_upload_or_404(upload_id: str, user_id: int) -> dict:
+    upload = get_upload(upload_id, user_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    return upload
+
+
+@app.get("/attachments/uploads/{upload_id}")
+async def get_attachment_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Возвращает, сколько байт загрузки уже принято."""
+    upload = get_upload_or_404(upload_id, current_user.id)
+    return {"received": upload["received"], "size": upload["size"]}
+
+
+@app.put("/attachments/uploads/{upload_id}")
+async def upload_attachment_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Принимает очередную часть файла в теле запроса."""
+    upload = get_upload_or_404(upload_id, current_user.id)
+    try:
+        received = await append_chunk(
+            upload_id, upload, offset, request.stream()
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"received": received, "size": upload["size"]}
+
+
+@app.post(
+    "/attachments/uploads/{upload_id}/complete",
+    response_model=AttachmentOut
+)
+async def complete_attachment_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Завершает загрузку и сохраняет вложение."""
+    upload = get_upload_or_404(upload_id, current_user.id)
+    try:
+        sha256, size = await asyncio.to_thread(
+            finish_upload, upload_id, upload
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return create_attachment(
+        db=db,
+        sha256=sha256,
+        size=size,
+        filename=upload["filename"],
+        content_type=upload["content_type"],
+        uploader_id=current_user.id
+    )
+
+
+@app.get("/attachments/{attachment_id}")
+async def download_attachment(
+    attachment_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Отдаёт содержимое вложения потоком с диска."""
+    attachment = get_accessible_attachment(db, attachment_id, current_user.id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+    return FileResponse(
+        blob_path(attachment.sha256),
+        media_type=attachment.content_type,
+        filename=attachment.filename
+    )
+
+
+@app.get("/chats/get_or_create/{user_id}", response_model=ChatOut)
 async def get_or_create_chat_route(
     user_id: int,
     db: Session = Depends(get_db),
@@ -119,11 +359,66 @@ async def get_or_create_chat_route(
     """Получает или создаёт чат между текущим пользователем и
     другим пользователем.
     """
-    return get_or_create_chat(
+    chat_id = get_or_create_chat_id(
         db=db,
         user1_id=current_user.id,
         user2_id=user_id
     )
+    if chat_id is None:
+        raise HTTPException(
+            status_code=404, detail="Пользователь не найден"
+        )
+    user1_id, user2_id = chat_pair(current_user.id, user_id)
+    return ChatOut(id=chat_id, user1_id=user1_id, user2_id=user2_id)
+
+
+@app.post("/chats/groups/", response_model=ChatOut)
+async def create_group_chat_route(
+    group: GroupChatCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Создаёт групповой чат с текущим пользователем и участниками."""
+    return create_group_chat(
+        db=db,
+        name=group.name,
+        creator_id=current_user.id,
+        member_ids=group.member_ids
+    )
+
+
+def get_chat_or_404(db: Session, chat_id: int):
+    chat = db.query(models.Chat.is_group, models.Chat.owner_id).filter(
+        models.Chat.id == chat_id).first()
+    if chat is None:
+        raise HTTPException(status_code=404, detail="Чат не найден")
+    return chat
+
+
+@app.post("/chats/{chat_id}/members/")
+async def add_chat_members_route(
+    chat_id: int,
+    members: ChatMembersAdd,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Добавляет участников в групповой чат. Доступно только владельцу."""
+    chat = get_chat_or_404(db, chat_id)
+    require_chat_member(db, chat_id, current_user.id)
+    if not chat.is_group:
+        raise HTTPException(
+            status_code=400,
+            detail="Добавлять участников можно только в групповой чат"
+        )
+    if chat.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=403,
+            detail="Управлять участниками может только владелец чата"
+        )
+    added = add_chat_members(db, chat_id, members.user_ids)
+    db.commit()
+    invalidate_chat_members(chat_id)
+    return {"added": added}
 
 
 @app.delete("/chats/{chat_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -132,15 +427,61 @@ async def delete_chat(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Удаляет чат и все сообщения в нём."""
-    chat = db.query(models.Chat).filter(models.Chat.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=404, detail="Чат не найден")
-    if current_user.id not in {chat.user1_id, chat.user2_id}:
+    """Удаляет чат и все сообщения в нём.
+
+    Личный чат может удалить любой из двух участников, групповой —
+    только владелец.
+    """
+    chat = get_chat_or_404(db, chat_id)
+    require_chat_member(db, chat_id, current_user.id)
+    if chat.is_group and chat.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=403,
+            detail="Удалить групповой чат может только владелец"
+        )
+    delete_chat_with_messages(db, chat_id)
+    invalidate_chat_members(chat_id)
+    clear_read_cursors(chat_id)
+    await disconnect_clients(chat_id)
+
+
+@app.delete(
+    "/chats/{chat_id}/members/me",
+    status_code=status.HTTP_204_NO_CONTENT
+)
+async def leave_chat(
+    chat_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Выход из группового чата: история остаётся у других участников."""
+    chat = get_chat_or_404(db, chat_id)
+    if not chat.is_group:
+        raise HTTPException(
+            status_code=400,
+            detail="Покинуть можно только групповой чат"
+        )
+    if chat.owner_id == current_user.id:
+        raise HTTPException(
+            status_code=400,
+            detail="Владелец не может покинуть чат, но может удалить его"
+        )
+    if not remove_chat_member(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Нет доступа к чату")
-    db.query(models.Message).filter(models.Message.chat_id == chat_id).delete()
-    db.delete(chat)
     db.commit()
+    invalidate_chat_members(chat_id)
+    await disconnect_clients(chat_id, user_id=current_user.id)
+
+
+@app.get("/chats/{chat_id}/read_cursors")
+async def get_chat_read_cursors(
+    chat_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Возвращает ID последних прочитанных сообщений участников."""
+    require_chat_member(db, chat_id, current_user.id)
+    return get_read_cursors(chat_id)
 
 
 async def get_token_data(token: str) -> int:
@@ -161,6 +502,87 @@ async def get_token_data(token: str) -> int:
         )
 
 
+def remove_client(chat_id: int, websocket: WebSocket):
+    """Убирает сокет из списка подключённых к чату."""
+    clients = connected_clients.get(chat_id, [])
+    if websocket in clients:
+        clients.remove(websocket)
+    if not clients:
+        connected_clients.pop(chat_id, None)
+
+
+async def disconnect_clients(chat_id: int, user_id: int = None):
+    """Закрывает сокеты чата с кодом 1008.
+
+    Если передан user_id, закрываются только сокеты этого пользователя.
+    Сокеты в других процессах закроются при следующем кадре, когда
+    цикл WebSocket перепроверит участие в чате.
+    """
+    clients = [
+        client for client in connected_clients.get(chat_id, [])
+        if user_id is None or client.state.user_id == user_id
+    ]
+    for client in clients:
+        remove_client(chat_id, client)
+    await asyncio.gather(
+        *(
+            client.close(code=status.WS_1008_POLICY_VIOLATION)
+            for client in clients
+        ),
+        return_exceptions=True
+    )
+
+
+async def broadcast(chat_id: int, data: str, exclude: WebSocket = None):
+    """Рассылает данные всем сокетам чата параллельно.
+
+    Сокеты, отправка в которые завершилась ошибкой, отключаются.
+    """
+    clients = [
+        client for client in connected_clients.get(chat_id, [])
+        if client is not exclude
+    ]
+    results = await asyncio.gather(
+        *(client.send_text(data) for client in clients),
+        return_exceptions=True
+    )
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            remove_client(chat_id, client)
+
+
+async def flush_later(
+    chat_id: int,
+    user_id: int,
+    event_type: str,
+    delay: float,
+    websocket: WebSocket
+):
+    """Рассылает отложенное эфемерное событие по окончании интервала."""
+    await asyncio.sleep(delay)
+    event = flush_event(chat_id, user_id, event_type)
+    if event is not None:
+        await broadcast(
+            chat_id,
+            outbound_event(chat_id, user_id, event),
+            exclude=websocket
+        )
+
+
+def schedule_flush(
+    chat_id: int,
+    user_id: int,
+    event_type: str,
+    delay: float,
+    websocket: WebSocket
+):
+    task = asyncio.create_task(
+        flush_later(chat_id, user_id, event_type, delay, websocket)
+    )
+    flush_tasks.add(task)
+    task.add_done_callback(flush_tasks.discard)
+
+
 @app.websocket("/ws/{chat_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
@@ -187,80 +609,232 @@ async def websocket_endpoint(
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
+    if not is_chat_member(db, chat_id, user_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     await websocket.accept()
+    websocket.state.user_id = user_id
 
     redis_client.sadd(f"chat:{chat_id}:users", user_id)
     redis_client.expire(f"chat:{chat_id}:users", 60)
 
     connected_clients.setdefault(chat_id, []).append(websocket)
+    await broadcast(
+        chat_id,
+        outbound_event(
+            chat_id, user_id, {"type": PRESENCE, "status": "online"}
+        ),
+        exclude=websocket
+    )
 
     try:
         while True:
-            data = await websocket.receive_text()
+            raw = await websocket.receive_text()
             redis_client.expire(f"chat:{chat_id}:users", 60)
+
+            if len(raw.encode("utf-8")) > settings.MAX_WS_FRAME_BYTES:
+                await websocket.send_text(error_event(
+                    "Кадр слишком большой",
+                    max_bytes=settings.MAX_WS_FRAME_BYTES
+                ))
+                continue
+
+            try:
+                event = parse_event(raw)
+            except ValueError as e:
+                await websocket.send_text(error_event(str(e)))
+                continue
+
+            # Пользователь мог покинуть чат или чат мог быть удалён,
+            # пока сокет был открыт.
+            if not is_chat_member(db, chat_id, user_id):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                break
+
+            if event["type"] in EPHEMERAL_TYPES:
+                allowed, retry_after = ws_event_limiter.hit(str(user_id))
+                if not allowed:
+                    await websocket.send_text(error_event(
+                        "Слишком много событий, попробуйте позже",
+                        retry_after=round(retry_after, 2)
+                    ))
+                    continue
+                if event["type"] == READ and not is_readable_message(
+                    db, chat_id, event["message_id"]
+                ):
+                    await websocket.send_text(
+                        error_event("Сообщение не найдено")
+                    )
+                    continue
+                delay = coalesce_event(chat_id, user_id, event)
+                if delay == 0:
+                    await broadcast(
+                        chat_id,
+                        outbound_event(chat_id, user_id, event),
+                        exclude=websocket
+                    )
+                elif delay:
+                    schedule_flush(
+                        chat_id, user_id, event["type"], delay, websocket
+                    )
+                continue
+
+            allowed, retry_after = ws_user_limiter.hit(str(user_id))
+            if allowed:
+                allowed, retry_after = ws_chat_limiter.hit(str(chat_id))
+            if not allowed:
+                await websocket.send_text(error_event(
+                    "Слишком много сообщений, попробуйте позже",
+                    retry_after=round(retry_after, 2)
+                ))
+                continue
+
+            data = event["content"]
+            attachment_id = event["attachment_id"]
+            if len(data) > settings.MAX_MESSAGE_LENGTH:
+                await websocket.send_text(error_event(
+                    "Сообщение слишком длинное",
+                    max_length=settings.MAX_MESSAGE_LENGTH
+                ))
+                continue
+            if attachment_id is not None and not get_accessible_attachment(
+                db, attachment_id, user_id
+            ):
+                await websocket.send_text(error_event("Вложение не найдено"))
+                continue
+
+            preview = truncate_preview(
+                data, settings.NOTIFICATION_PREVIEW_LENGTH
+            )
+            if attachment_id is not None:
+                preview = f"{preview} [вложение]".strip()
+            notification_text = f"Новое сообщение от {sender_name}: {preview}"
+            online_user_ids = redis_client.smembers(f"chat:{chat_id}:users")
             new_message = create_message(
                 db=db,
                 chat_id=chat_id,
                 sender_id=user_id,
-                message_data=MessageCreate(content=data)
+                message_data=MessageCreate(
+                    content=data, attachment_id=attachment_id
+                ),
+                notification_text=notification_text,
+                online_user_ids=map(int, online_user_ids)
             )
+            outbox_ready.set()
             message_out = MessageOut.from_orm(new_message)
-            message_data = json.dumps(serialize_message(message_out))
+            message_data = json.dumps(
+                {"type": MESSAGE, **serialize_message(message_out)}
+            )
 
             redis_client.lpush(f"chat:{chat_id}:messages", message_data)
             redis_client.ltrim(f"chat:{chat_id}:messages", 0, 49)
 
-            for client in connected_clients[chat_id]:
-                try:
-                    await client.send_text(message_data)
-                except WebSocketDisconnect:
-                    connected_clients[chat_id].remove(client)
-                    redis_client.srem(f"chat:{chat_id}:users", user_id)
-
-            chat_participants = [
-                new_message.chat.user1_id,
-                new_message.chat.user2_id
-            ]
-            for participant_id in chat_participants:
-                if participant_id != user_id:
-                    recipient = db.query(User).filter(
-                        User.id == participant_id).first()
-                    if recipient and recipient.telegram_id:
-                        notification_text = (
-                            f"Новое сообщение от {sender_name}: {data}"
-                        )
-                        send_notification_task.delay(
-                                recipient.telegram_id,
-                                notification_text
-                        )
+            await broadcast(chat_id, message_data)
 
     except WebSocketDisconnect:
-        redis_client.srem(f"chat:{chat_id}:users", user_id)
-        connected_clients[chat_id].remove(websocket)
-        if not connected_clients[chat_id]:
-            del connected_clients[chat_id]
+        pass
+    finally:
+        remove_client(chat_id, websocket)
+        try:
+            redis_client.srem(f"chat:{chat_id}:users", user_id)
+        except RedisError as e:
+            print(f"Не удалось убрать пользователя из онлайна: {e}")
+        await broadcast(
+            chat_id,
+            outbound_event(
+                chat_id, user_id, {"type": PRESENCE, "status": "offline"}
+            )
+        )
 
 
 async def cleanup_inactive_chats():
     """Фоновая задача для очистки неактивных чатов в Redis."""
     while True:
         print("Запуск фоновой очистки...")
-        chat_keys = redis_client.keys("chat:*:users")
-
-        for chat_key in chat_keys:
-            ttl = redis_client.ttl(chat_key)
-            if ttl == -2:
-                chat_id = chat_key.split(":")[1]
-                print(f"Чат {chat_id} удален из Redis.")
-                redis_client.delete(f"chat:{chat_id}:messages")
+        try:
+            chat_keys = redis_client.keys("chat:*:users")
+
+            for chat_key in chat_keys:
+                ttl = redis_client.ttl(chat_key)
+                if ttl == -2:
+                    chat_id = chat_key.split(":")[1]
+                    print(f"Чат {chat_id} удален из Redis.")
+                    redis_client.delete(f"chat:{chat_id}:messages")
+        except RedisError as e:
+            print(f"Ошибка фоновой очистки: {e}")
+        try:
+            await asyncio.to_thread(cleanup_stale_uploads)
+            await asyncio.to_thread(cleanup_stale_exports)
+        except OSError as e:
+            print(f"Ошибка очистки файлов: {e}")
 
         await asyncio.sleep(600)
 
 
-@app.on_event("startup")
-async def on_startup():
-    asyncio.create_task(start_bot())
-    asyncio.create_task(cleanup_inactive_chats())
+def relay_outbox_once() -> int:
+    with SessionLocal() as db:
+        return relay_outbox_batch(db, settings.OUTBOX_BATCH_SIZE)
+
+
+async def relay_outbox():
+    """Фоновая задача, переносящая уведомления из outbox в брокер.
+
+    Просыпается по сигналу после нового сообщения или раз в
+    OUTBOX_POLL_INTERVAL секунд. Работа с БД и брокером выполняется
+    в отдельном потоке, чтобы не блокировать event loop.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(
+                outbox_ready.wait(), settings.OUTBOX_POLL_INTERVAL
+            )
+        except asyncio.TimeoutError:
+            pass
+        outbox_ready.clear()
+        try:
+            while await asyncio.to_thread(relay_outbox_once) > 0:
+                pass
+        except Exception as e:
+            print(f"Ошибка ретрансляции outbox: {e}")
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+
+@app.post(settings.TELEGRAM_WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str = Header(None)
+):
+    """Принимает обновления Telegram в режиме webhook.
+
+    Без TELEGRAM_WEBHOOK_SECRET webhook отклоняет все запросы: иначе
+    любой мог бы прислать поддельное обновление и привязать чужой email.
+    """
+    if settings.TELEGRAM_MODE != "webhook":
+        raise HTTPException(status_code=404, detail="Webhook отключён")
+    if not settings.TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token or "",
+        settings.TELEGRAM_WEBHOOK_SECRET
+    ):
+        raise HTTPException(status_code=403, detail="Неверный секрет")
+    from telegram.bot import feed_webhook_update
+    await feed_webhook_update(await request.json())
+    return {"ok": True}
+
+
+@app.get("/admin/rate_limits/")
+async def get_rate_limit_stats(admin: User = Depends(get_admin_user)):
+    """Возвращает счётчики запросов, отклонённых rate limiter."""
+    return get_throttled_stats()
+
+
+@app.get("/admin/notifications/stats/")
+async def get_notification_delivery_stats(
+    days: int = Query(7, ge=1, le=90),
+    admin: User = Depends(get_admin_user)
+):
+    """Возвращает статистику доставки уведомлений по дням."""
+    return get_notification_stats(days=days)
 
 
 @app.get("/test_celery/")
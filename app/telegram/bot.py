@@ -1,15 +1,65 @@
+import asyncio
+import uuid
+from typing import Optional
+
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import Message, Update
+from sqlalchemy import update
 
 from db.database import SessionLocal
 from db.models import User
 from core.config import settings
+from core.redis import redis_client
 
 API_TOKEN = settings.TELEGRAM_TOKEN
+LEADER_KEY = "telegram:leader"
+
+# Продлевает лидерство, только если ключ всё ещё принадлежит нам.
+RENEW_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
-bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
+instance_id = uuid.uuid4().hex
+renew_leader = redis_client.register_script(RENEW_LEADER_SCRIPT)
+release_leader = redis_client.register_script(RELEASE_LEADER_SCRIPT)
+_bot: Optional[Bot] = None
+
+
+def get_bot() -> Bot:
+    """Создаёт клиента Bot API при первом обращении."""
+    global _bot
+    if _bot is None:
+        _bot = Bot(token=API_TOKEN)
+    return _bot
+
+
+async def close_bot():
+    """Закрывает HTTP-сессию бота, если он был создан."""
+    if _bot is not None:
+        await _bot.session.close()
+
+
+def link_telegram_account(email: str, telegram_id: int) -> bool:
+    """Привязывает Telegram ID к пользователю с указанным email."""
+    with SessionLocal() as db:
+        result = db.execute(
+            update(User).where(User.email == email).values(
+                telegram_id=telegram_id
+            )
+        )
+        db.commit()
+        return result.rowcount > 0
 
 
 @dp.message(Command("start"))
@@ -17,24 +67,111 @@ async def start_handler(message: Message):
     await message.answer("Привет! Отправь свой email для привязки к аккаунту.")
 
 
-@dp.message(lambda message: "@" in message.text)
+@dp.message(lambda message: message.text and "@" in message.text)
 async def handle_email_verification(message: Message):
     email = message.text.strip()
 
-    with SessionLocal() as db:
-        user = db.query(User).filter(User.email == email).first()
-
-        if user:
-            user.telegram_id = message.from_user.id
-            db.commit()
-            await message.reply(f"Ваш email {email} был привязан.")
-        else:
-            await message.reply(
-                "Email не найден. Пожалуйста, убедитесь,"
-                "что вы зарегистрированы."
+    linked = await asyncio.to_thread(
+        link_telegram_account, email, message.from_user.id
+    )
+    if linked:
+        await message.reply(f"Ваш email {email} был привязан.")
+    else:
+        await message.reply(
+            "Email не найден. Пожалуйста, убедитесь,"
+            "что вы зарегистрированы."
+        )
+
+
+async def feed_webhook_update(data: dict):
+    """Передаёт обновление, полученное через webhook, в диспетчер."""
+    bot = get_bot()
+    update_obj = Update.model_validate(data, context={"bot": bot})
+    await dp.feed_update(bot, update_obj)
+
+
+def acquire_leadership() -> bool:
+    return bool(redis_client.set(
+        LEADER_KEY, instance_id, nx=True, ex=settings.TELEGRAM_LEADER_TTL
+    ))
+
+
+async def poll_as_leader():
+    """Запускает polling, пока этот процесс удерживает лидерство.
+
+    Лидерство продлевается каждые TELEGRAM_LEADER_TTL / 3 секунд.
+    Если продлить не удалось (в том числе из-за ошибки Redis) или
+    задачу отменили, polling останавливается до освобождения
+    лидерства, чтобы два процесса не забирали обновления одновременно.
+    """
+    bot = get_bot()
+    polling = None
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        polling = asyncio.create_task(
+            dp.start_polling(bot, skip_updates=True, handle_signals=False)
+        )
+        while not polling.done():
+            await asyncio.sleep(settings.TELEGRAM_LEADER_TTL / 3)
+            renewed = renew_leader(
+                keys=[LEADER_KEY],
+                args=[instance_id, settings.TELEGRAM_LEADER_TTL]
             )
+            if not renewed:
+                print("Лидерство Telegram-бота потеряно.")
+                break
+        if polling.done():
+            await polling
+    finally:
+        if polling is not None and not polling.done():
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+        release_leader(keys=[LEADER_KEY], args=[instance_id])
+
+
+async def run_polling():
+    """Ожидает лидерство и забирает обновления, пока оно удерживается."""
+    while True:
+        try:
+            if acquire_leadership():
+                await poll_as_leader()
+        except Exception as e:
+            print(f"Ошибка Telegram-бота: {e}")
+        await asyncio.sleep(settings.TELEGRAM_LEADER_TTL / 3)
 
 
 async def start_bot():
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot, skip_updates=True)
+    """Запускает приём обновлений Telegram в выбранном режиме.
+
+    В режиме webhook обновления приходят на WEBHOOK_PATH каждого
+    процесса, а регистрирует webhook только лидер. В режиме polling
+    обновления забирает единственный процесс-лидер, остальные ждут
+    освобождения лидерства.
+    """
+    if settings.TELEGRAM_MODE == "off":
+        return
+    if not API_TOKEN:
+        print("TELEGRAM_TOKEN не задан, Telegram-бот не запущен.")
+        return
+
+    if settings.TELEGRAM_MODE == "webhook":
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            print(
+                "TELEGRAM_WEBHOOK_SECRET не задан, webhook не "
+                "зарегистрирован."
+            )
+            return
+        if acquire_leadership():
+            await get_bot().set_webhook(
+                settings.TELEGRAM_WEBHOOK_URL.rstrip("/")
+                + settings.TELEGRAM_WEBHOOK_PATH,
+                secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+                drop_pending_updates=True
+            )
+        return
+
+    await run_polling()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_polling())
@@ -0,0 +1,56 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.config import settings
+
+
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+
+# Общая сессия переиспользует соединения с api.telegram.org между задачами.
+# В gevent-пуле сокеты пропатчены, поэтому запросы не блокируют воркер.
+session = requests.Session()
+session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.CELERY_WORKER_CONCURRENCY
+    )
+)
+
+
+class TelegramError(Exception):
+    """Ошибка Telegram Bot API, повтор которой не поможет."""
+
+
+class TelegramRetryableError(TelegramError):
+    """Временная ошибка: сеть, 429 или 5xx."""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def send_message(chat_id: int, text: str) -> dict:
+    """Отправляет сообщение через Telegram Bot API."""
+    url = API_URL.format(token=settings.TELEGRAM_TOKEN, method="sendMessage")
+    try:
+        response = session.post(
+            url,
+            json={"chat_id": chat_id, "text": text},
+            timeout=settings.TELEGRAM_REQUEST_TIMEOUT
+        )
+    except requests.RequestException as e:
+        raise TelegramRetryableError(str(e))
+
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    description = payload.get("description", response.text)
+
+    if response.status_code == 429 or response.status_code >= 500:
+        retry_after = payload.get("parameters", {}).get("retry_after", 0)
+        raise TelegramRetryableError(description, retry_after=retry_after)
+    if not payload.get("ok"):
+        raise TelegramError(description)
+    return payload["result"]
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Модули приложения импортируются из app/, как в контейнере.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:TEST-TOKEN")
+os.environ.setdefault("TELEGRAM_MODE", "off")
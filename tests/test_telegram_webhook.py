@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from aiogram.types import Message
+from fastapi.testclient import TestClient
+
+import main
+from core.config import settings
+from telegram import bot
+
+
+SECRET = "webhook-secret"
+
+
+def make_update(text: str, telegram_id: int = 42) -> dict:
+    """Обновление в том виде, в котором его присылает Telegram."""
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": {
+                "id": telegram_id, "is_bot": False, "first_name": "Test"
+            },
+            "text": text,
+        },
+    }
+
+
+@pytest.fixture
+def fake_telegram(monkeypatch):
+    """Подменяет БД и отправку ответов, записывая вызовы."""
+    calls = {"linked": [], "replies": []}
+
+    def link_telegram_account(email, telegram_id):
+        calls["linked"].append((email, telegram_id))
+        return email == "user@example.com"
+
+    async def reply(self, text, **kwargs):
+        calls["replies"].append(text)
+
+    monkeypatch.setattr(bot, "link_telegram_account", link_telegram_account)
+    monkeypatch.setattr(Message, "reply", reply)
+    return calls
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_MODE", "webhook")
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", SECRET)
+    return TestClient(main.app)
+
+
+def test_feed_webhook_update_links_email(fake_telegram):
+    asyncio.run(bot.feed_webhook_update(make_update("user@example.com")))
+
+    assert fake_telegram["linked"] == [("user@example.com", 42)]
+    assert fake_telegram["replies"] == [
+        "Ваш email user@example.com был привязан."
+    ]
+
+
+def test_feed_webhook_update_unknown_email(fake_telegram):
+    asyncio.run(bot.feed_webhook_update(make_update("nobody@example.com")))
+
+    assert fake_telegram["linked"] == [("nobody@example.com", 42)]
+    assert fake_telegram["replies"][0].startswith("Email не найден")
+
+
+def test_webhook_accepts_update_with_secret(client, fake_telegram):
+    response = client.post(
+        settings.TELEGRAM_WEBHOOK_PATH,
+        json=make_update("user@example.com"),
+        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    )
+
+    assert response.status_code == 200
+    assert fake_telegram["linked"] == [("user@example.com", 42)]
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+])
+def test_webhook_rejects_wrong_secret(client, fake_telegram, headers):
+    response = client.post(
+        settings.TELEGRAM_WEBHOOK_PATH,
+        json=make_update("user@example.com"),
+        headers=headers
+    )
+
+    assert response.status_code == 403
+    assert fake_telegram["linked"] == []
+
+
+def test_webhook_rejects_all_without_configured_secret(
+    client, fake_telegram, monkeypatch
+):
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", None)
+    response = client.post(
+        settings.TELEGRAM_WEBHOOK_PATH,
+        json=make_update("user@example.com"),
+        headers={"X-Telegram-Bot-Api-Secret-Token": ""}
+    )
+
+    assert response.status_code == 403
+    assert fake_telegram["linked"] == []